@@ -11,28 +11,35 @@ Description: Processes raw, global, monthly ERA5 NetCDF files by performing vert
 import xarray as xr
 import pandas as pd
 import zipfile
-import os
 import numpy as np
 
+# Dask chunks: one year of months per chunk, full global grid per time step
+CHUNKS = {'valid_time': 12, 'latitude': -1, 'longitude': -1}
+
 # --- 1. Load and Merge Data ---
 # 1.1 Load Pressure Level Data (e.g., z, q, t at 500hPa, 850hPa, etc.)
 try:
-    ds1 = xr.open_dataset('era5_pressure_monthly.nc', engine='netcdf4')
+    # Chunked along time so the regional means below run as one streamed Dask reduction
+    ds1 = xr.open_dataset('era5_pressure_monthly.nc', engine='netcdf4', chunks=CHUNKS)
 except FileNotFoundError:
     print("Error: 'era5_pressure_monthly.nc' not found. Run download_era5.py first.")
     exit()
 
-# 1.2 Load and Extract Surface Level Data (e.g., tp)
+# 1.2 Load Surface Level Data (e.g., tp)
+# Requested unarchived from CDS; older downloads may still be a ZIP wrapping the NetCDF, which is read
+# in place through a file-like handle instead of being extracted to disk
 try:
-    extracted_dir = 'extracted_surface_data'
-    with zipfile.ZipFile('era5_surface_monthly.nc', 'r') as zip_ref:
-        zip_ref.extractall(extracted_dir)
-    nc_file = os.path.join(extracted_dir, os.listdir(extracted_dir)[0])
+    if zipfile.is_zipfile('era5_surface_monthly.nc'):
+        surface_zip = zipfile.ZipFile('era5_surface_monthly.nc', 'r')
+        nc_name = next(name for name in surface_zip.namelist() if name.endswith('.nc'))
+        surface_source = surface_zip.open(nc_name)
+    else:
+        surface_source = 'era5_surface_monthly.nc'
     # Use h5netcdf engine for robustness
-    ds2 = xr.open_dataset(nc_file, engine='h5netcdf')
+    ds2 = xr.open_dataset(surface_source, engine='h5netcdf', chunks=CHUNKS)
 except Exception as e:
-    # Catches FileNotFoundError (if the zip isn't there) or IO errors (if the file is corrupt/unreadable)
-    print(f"FATAL ERROR: Could not process era5_surface_monthly.nc even with ZIP handler. Error: {e}")
+    # Catches FileNotFoundError (if the file isn't there) or IO errors (if the file is corrupt/unreadable)
+    print(f"FATAL ERROR: Could not process era5_surface_monthly.nc. Error: {e}")
     exit()
 
 # Merge pressure and surface level data
@@ -55,6 +62,35 @@ analysis_vars = {
     "tp": {"level": None, "regions": ["E_Africa"]},      # tp is surface-level precipitation
 }
 
+# --- 2.1. Grid Indices and Area Weights (computed once) ---
+# ERA5 latitudes run from 90 to -90, longitudes from 0 to 360
+lat = ds_combined.latitude.values
+lon = ds_combined.longitude.values
+# Grid-cell area shrinks with cos(latitude); without weighting, high-latitude boxes are biased poleward
+lat_weights = np.cos(np.deg2rad(lat))
+
+
+def region_indices(region):
+    """Latitude index range and longitude index slabs of a region (inclusive bounds, like .sel slices)."""
+    i0 = np.searchsorted(-lat, -region["lat"][1], side='left')
+    i1 = np.searchsorted(-lat, -region["lat"][0], side='right')
+
+    if region["lon"][1] - region["lon"][0] >= 360:
+        return i0, i1, [slice(0, len(lon))]
+
+    lon_min = region["lon"][0] % 360
+    lon_max = region["lon"][1] % 360
+    j0 = np.searchsorted(lon, lon_min, side='left')
+    j1 = np.searchsorted(lon, lon_max, side='right')
+
+    # Handles regions that cross the Prime Meridian (Longitude Wrapping)
+    if lon_max < lon_min:
+        return i0, i1, [slice(j0, len(lon)), slice(0, j1)]
+    return i0, i1, [slice(j0, j1)]
+
+
+region_bounds = {name: region_indices(region) for name, region in regions.items()}
+
 regional_ts = {}
 
 # --- 3. Aggregation Loop ---
@@ -75,44 +111,46 @@ for var, var_config in analysis_vars.items():
     if "pressure_level" in data.dims and var_config["level"] is None:
         data = data.mean(dim='pressure_level')
 
-    for name in var_config["regions"]:
-        region = regions[name]
+    # Raw array with the spatial dimensions last, shared by all regions of this variable
+    data = data.transpose(..., 'latitude', 'longitude')
+    arr = data.data
+    time_dims = data.dims[:-2]
 
+    for name in var_config["regions"]:
         # --- 3.2. Spatial Aggregation & Subsetting ---
-        # Latitude slice is reversed (high to low) for xarray's indexing convention
-        lat_slice = slice(region["lat"][1], region["lat"][0])
-        lon_min = region["lon"][0] % 360
-        lon_max = region["lon"][1] % 360
-
-        # Handles regions that cross the Prime Meridian (Longitude Wrapping)
-        if lon_max < lon_min:
-            subset = xr.concat([
-                data.sel(latitude=lat_slice, longitude=slice(lon_min, 360)),
-                data.sel(latitude=lat_slice, longitude=slice(0, lon_max))
-            ], dim='longitude')
-        else:
-            subset = data.sel(latitude=lat_slice, longitude=slice(lon_min, lon_max))
-
-        # Calculate the final spatial mean across the selected region
-        spatial_mean_ts = subset.mean(dim=["latitude", "longitude"])
-
-        # Convert to a Pandas Series and store
+        i0, i1, lon_slabs = region_bounds[name]
+
+        # Works on the underlying (Dask) array; the wrap case is joined once along longitude
+        subset = np.concatenate([arr[..., i0:i1, lon_slab] for lon_slab in lon_slabs], axis=-1)
+
+        # Area-weighted spatial mean over the region, skipping missing cells
+        weights = lat_weights[i0:i1][:, None]
+        spatial_mean = (np.nansum(subset * weights, axis=(-2, -1))
+                        / np.sum(~np.isnan(subset) * weights, axis=(-2, -1)))
+        spatial_mean_ts = xr.DataArray(spatial_mean, dims=time_dims, coords={d: data[d] for d in time_dims})
+
+        # Stored lazily; leftover scalar coordinates are dropped so the series can share one Dataset
         ts_name = f"{var}_{var_config['level'] or ''}_{name}"
-        regional_ts[ts_name] = spatial_mean_ts.to_pandas()
+        regional_ts[ts_name] = spatial_mean_ts.reset_coords(drop=True)
         print(f"  - Aggregated: {ts_name}")
 
-# --- 4. Final Concatenation and Save ---
-df = pd.concat(regional_ts, axis=1)
+# Execute every regional mean in one fused Dask graph, so shared chunks are read from disk only once
+regional_ds = xr.Dataset(regional_ts).compute()
+
+# --- 4. Final DataFrame Construction and Save ---
+# Every series shares the Dataset's valid_time index, so the frame is built directly from the arrays.
+# Column names are cleaned in the same pass (e.g. 't_1000_ENSO' -> 't1000_ENSO', 'tp__E_Africa' -> 'tp_E_Africa')
+ts_index = regional_ds.get_index('valid_time')
+df = pd.DataFrame(
+    {
+        ts_name.replace('_1000_', '1000_').replace('_500_', '500_').replace('_850_', '850_')
+               .replace('tp__E_Africa', 'tp_E_Africa'): regional_ds[ts_name].values
+        for ts_name in regional_ts
+    },
+    index=ts_index,
+)
 df.index.name = 'valid_time'
 
-# Rename columns to a clean format
-df.columns = [
-    col.replace('_1000_', '1000_').replace('_500_', '500_').replace('_850_', '850_')
-    for col in df.columns
-]
-# Clean up the 'tp' column name
-df.columns = [col.replace('tp__E_Africa', 'tp_E_Africa') for col in df.columns]
-
 df.to_csv("regional_timeseries_final.csv")
 print("\n--- Final Aggregated Time Series Head ---")
 print(df.head())
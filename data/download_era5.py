@@ -9,9 +9,11 @@ Description: Script to download comprehensive monthly mean ERA5 reanalysis data
 
 import cdsapi
 import os
+from concurrent.futures import ThreadPoolExecutor
 
-# 1. Initialize the CDS API client
-c = cdsapi.Client()
+# 1. Initialize the CDS API clients (one per request, so the two downloads can run concurrently)
+c_surface = cdsapi.Client()
+c_pressure = cdsapi.Client()
 
 # Define the years to download (e.g., 20 years for robust climatology)
 years = [str(y) for y in range(2000, 2020)] # 20 full years
@@ -40,40 +42,47 @@ print("Starting download of required ERA5 monthly mean data (2000-2019)...")
 
 # Request 1: Single-Level Variables (Surface Data)
 # Downloads surface and accumulated variables (tp, sst)
-c.retrieve(
-    'reanalysis-era5-single-levels-monthly-means',
-    {
-        'product_type': 'monthly_averaged_reanalysis',
-        'variable': surface_variables,
-        'year': years,
-        'month': [
-            '01', '02', '03', '04', '05', '06',
-            '07', '08', '09', '10', '11', '12',
-        ],
-        'time': '00:00',
-        'format': 'netcdf',
-    },
-    'era5_surface_monthly.nc'
-)
+surface_request = {
+    'product_type': 'monthly_averaged_reanalysis',
+    'variable': surface_variables,
+    'year': years,
+    'month': [
+        '01', '02', '03', '04', '05', '06',
+        '07', '08', '09', '10', '11', '12',
+    ],
+    'time': '00:00',
+    'format': 'netcdf',
+    'download_format': 'unarchived',  # Plain NetCDF instead of a ZIP wrapping it
+}
 
 # Request 2: Pressure-Level Variables (Atmospheric Data)
 # Downloads atmospheric dynamics variables (t, z, q) at specified levels
-c.retrieve(
-    'reanalysis-era5-pressure-levels-monthly-means',
-    {
-        'product_type': 'monthly_averaged_reanalysis',
-        'variable': pressure_variables,
-        'pressure_level': pressure_levels,
-        'year': years,
-        'month': [
-            '01', '02', '03', '04', '05', '06',
-            '07', '08', '09', '10', '11', '12',
-        ],
-        'time': '00:00',
-        'format': 'netcdf',
-    },
-    'era5_pressure_monthly.nc'
-)
+pressure_request = {
+    'product_type': 'monthly_averaged_reanalysis',
+    'variable': pressure_variables,
+    'pressure_level': pressure_levels,
+    'year': years,
+    'month': [
+        '01', '02', '03', '04', '05', '06',
+        '07', '08', '09', '10', '11', '12',
+    ],
+    'time': '00:00',
+    'format': 'netcdf',
+    'download_format': 'unarchived',  # Plain NetCDF instead of a ZIP wrapping it
+}
+
+# The two requests are independent, so their CDS queue time and transfer overlap instead of running back-to-back
+with ThreadPoolExecutor(max_workers=2) as executor:
+    surface_future = executor.submit(
+        c_surface.retrieve, 'reanalysis-era5-single-levels-monthly-means', surface_request, 'era5_surface_monthly.nc'
+    )
+    pressure_future = executor.submit(
+        c_pressure.retrieve, 'reanalysis-era5-pressure-levels-monthly-means', pressure_request,
+        'era5_pressure_monthly.nc'
+    )
+    # Re-raises any download error
+    surface_future.result()
+    pressure_future.result()
 
 print("\nDownload finished. Files saved as 'era5_surface_monthly.nc' and 'era5_pressure_monthly.nc'.")
 print("Next step: Run 'data/aggregate.py' to process these files.")
\ No newline at end of file
@@ -10,7 +10,7 @@ Description: The main execution script for the CausalEarthNet project. This file
 
 # Import modules
 from src.config import TAU_MAX, PC_ALPHA, ALPHA_LEVEL, MAX_HYPEREDGE_SIZE, RANDOM_STATE, RIDGE_ALPHA, TEST_SIZE, \
-    KNN_NEIGHBORS, N_PERMUTATIONS
+    KNN_NEIGHBORS, N_PERMUTATIONS, MIN_MARGINAL_MI, N_JOBS
 from data.preprocess import load_clean_data, create_lagged_data_frame
 from src.baseline import run_pcmciplus_baseline
 from src.hypergraph_discovery import HypergraphCausalDiscovery
@@ -46,7 +46,9 @@ def main():
         ridge_alpha=RIDGE_ALPHA,
         test_size=TEST_SIZE,
         random_state=RANDOM_STATE,
-        n_permutations=N_PERMUTATIONS
+        n_permutations=N_PERMUTATIONS,
+        min_marginal_mi=MIN_MARGINAL_MI,
+        n_jobs=N_JOBS
     )
 
     # Set the PCMCI+ links as the known competition (Baseline)
@@ -37,19 +37,22 @@ def run_pcmciplus_baseline(data, tau_max, pc_alpha, alpha_level, var_names, knn_
     # Deducing the best lag from the p_matrix (shape is [N, N, tau_max + 1])
     # Index 0 is lag 0 (contemporaneous), we search from index 1 (lag 1 to tau_max).
 
-    N = len(var_names)
-    for j in range(N):  # target index
-        for i in range(N):  # driver index
-            if p_matrix.shape[2] > 1:
-                # Find the minimum P-value across all non-contemporaneous lags
-                min_p_index = np.argmin(p_matrix[i, j, 1:])  # Index of the best lag (0 to tau_max-1)
-                min_p_value = p_matrix[i, j, min_p_index + 1]  # Value of the best lag
-
-                # The actual lag is the index + 1
-                lag = min_p_index + 1
-
-                if min_p_value < alpha_level:
-                    pairwise_links.append((var_names[i], var_names[j], lag, min_p_value))
+    if p_matrix.shape[2] > 1:
+        # Minimum P-value across all non-contemporaneous lags, for every (driver, target) pair at once
+        sub = p_matrix[:, :, 1:]
+        best_lag_idx = sub.argmin(axis=2)  # Index of the best lag (0 to tau_max-1)
+        best_p = np.take_along_axis(sub, best_lag_idx[..., None], axis=2).squeeze(-1)
+
+        # Transposed so links are ordered by target first, then driver
+        jj, ii = np.where((best_p < alpha_level).T)
+
+        # The actual lag is the index + 1
+        lags = best_lag_idx[ii, jj] + 1
+        ps = best_p[ii, jj]
+
+        pairwise_links = [
+            (var_names[i], var_names[j], lag, p_value) for i, j, lag, p_value in zip(ii, jj, lags, ps)
+        ]
 
     print(f"\nDiscovered Pairwise Links (P-value < {alpha_level}):")
     if not pairwise_links:
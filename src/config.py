@@ -24,4 +24,8 @@ MAX_HYPEREDGE_SIZE = 3 # Maximum size of a hyperedge (set of drivers)
 
 # --- Configuration for CMI Test ---
 KNN_NEIGHBORS = 5 # Number of nearest neighbors for CMIknn test
-N_PERMUTATIONS = 20 # Number of permutations for the CMI independence test
\ No newline at end of file
+N_PERMUTATIONS = 20 # Number of permutations for the CMI independence test
+MIN_MARGINAL_MI = 0.0 # Drivers whose marginal MI with the target residuals is not above this are skipped
+
+# --- Configuration for Parallel Execution ---
+N_JOBS = -1 # Worker processes for the hyperedge independence tests (-1 uses all cores)
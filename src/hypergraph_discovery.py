@@ -11,11 +11,94 @@ Description: Implements the HypergraphCausalDiscovery class, which performs two
 # src/hypergraph_discovery.py
 import numpy as np
 import itertools
+from joblib import Parallel, delayed
+from scipy.spatial import cKDTree
+from scipy.special import digamma
 from sklearn.feature_selection import mutual_info_regression
-from sklearn.linear_model import Ridge
-from sklearn.metrics import r2_score
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
+
+# Neighbour count of the KSG estimator (matches sklearn's mutual_info_regression default)
+_KSG_NEIGHBORS = 3
+
+
+def _ridge_projection(Z, alpha=0.1):
+    """
+    Precomputes the centred ridge solve for Z, equivalent to Ridge(alpha).fit(Z, .) with an intercept.
+    Returns (Z_centred, (Z_cᵀZ_c + αI)⁻¹Z_cᵀ) so residuals of any target need one matmul.
+    """
+    Z_centred = Z - Z.mean(axis=0)
+    proj = np.linalg.solve(Z_centred.T @ Z_centred + alpha * np.eye(Z.shape[1], dtype=Z.dtype), Z_centred.T)
+    return Z_centred, proj
+
+
+def _ridge_r2(X_train, Y_train, X_test, Y_test, alpha):
+    """
+    Test-set R² of a ridge regression fitted in closed form, (XᵀX + αI)⁻¹XᵀY on the standardized
+    training drivers with an intercept. Equivalent to StandardScaler + Ridge(alpha) + r2_score.
+    """
+    x_mean = X_train.mean(axis=0)
+    x_std = X_train.std(axis=0)
+    x_std[x_std == 0] = 1.0
+    y_mean = Y_train.mean()
+
+    X_c = (X_train - x_mean) / x_std
+    beta = np.linalg.solve(X_c.T @ X_c + alpha * np.eye(X_c.shape[1]), X_c.T @ (Y_train - y_mean))
+    pred = (X_test - x_mean) / x_std @ beta + y_mean
+    return 1 - np.sum((Y_test - pred) ** 2) / np.sum((Y_test - Y_test.mean()) ** 2)
+
+
+def _scale_for_ksg(residual, random_state):
+    """
+    Scales residuals to unit variance and adds tiny noise to break ties, as mutual_info_regression does.
+    The noise is raised to the dtype's resolution so it still breaks ties in float32; the dtype is kept.
+    """
+    rng = np.random.RandomState(random_state)
+    # Constant columns are left unscaled (std treated as 1), as sklearn's scale does
+    std = residual.std(axis=0)
+    residual = residual / np.where(std == 0, 1, std).astype(residual.dtype)
+    noise = max(1e-10, np.finfo(residual.dtype).eps) * np.maximum(1, np.mean(np.abs(residual), axis=0)) * rng.standard_normal(
+        residual.shape)
+    return np.ascontiguousarray(residual + noise.astype(residual.dtype))
+
+
+def _ksg_joint_radii(x, y_perms, k):
+    """Distance to the k-th neighbour in the joint (max-norm) space of x and each row of y_perms."""
+    radii = np.empty(y_perms.shape)
+    for row, y_perm in enumerate(y_perms):
+        # One KD-tree per permutation; k + 1 neighbours because the nearest one is the query point itself
+        joint = cKDTree(np.c_[x, y_perm])
+        radii[row] = joint.query(joint.data, k=k + 1, p=np.inf)[0][:, -1]
+    return radii
+
+
+def _ksg_mean_mi(residual_x, trees_x, residual_y, tree_y, perms, k):
+    """
+    KSG estimate (Kraskov et al. 2004, estimator 1) of the mean univariate MI between the columns of
+    residual_x and residual_y[perm], one value per row of perms.
+    All neighbour searches run on KD-trees: the joint k-th neighbour distances on one tree per
+    permutation, the marginal counts on trees built once on the unpermuted residuals (permuting y
+    does not change the set of y values, only which x each one is paired with).
+    """
+    n_perm, n = perms.shape
+    mi = np.zeros(n_perm)
+    if residual_x.shape[1] == 0:
+        return mi
+
+    # (n_perm, n) matrix of permuted y values, shared by every column; queried against tree_y in a single batch
+    y_perms = residual_y[perms]
+    y_perms_flat = y_perms.reshape(-1, 1)
+    for c in range(residual_x.shape[1]):
+        x = residual_x[:, c]
+        # Marginal neighbours must lie strictly inside the joint k-th neighbour distance
+        radii = np.nextafter(_ksg_joint_radii(x, y_perms, k), 0).ravel()
+
+        # Counts include the query point itself, i.e. they are already n_x + 1 and n_y + 1
+        nx = trees_x[c].query_ball_point(np.tile(x, n_perm)[:, None], radii, p=np.inf, return_length=True)
+        ny = tree_y.query_ball_point(y_perms_flat, radii, p=np.inf, return_length=True)
+        psi_marginal = digamma(nx.reshape(n_perm, n)).mean(axis=1) + digamma(ny.reshape(n_perm, n)).mean(axis=1)
+        mi += np.maximum(0.0, digamma(n) + digamma(k) - psi_marginal)
+
+    return mi / residual_x.shape[1]
+
 
 class HypergraphCausalDiscovery:
     """
@@ -23,54 +106,83 @@ class HypergraphCausalDiscovery:
     Implements the novel method to discover higher-order (set-wise) interactions.
     """
 
-    def __init__(self, max_hyperedge_size, significance_level, ridge_alpha, test_size, random_state, n_permutations):
+    def __init__(self, max_hyperedge_size, significance_level, ridge_alpha, test_size, random_state, n_permutations,
+                 min_marginal_mi=0.0, n_jobs=-1):
         self.max_hyperedge_size = max_hyperedge_size
         self.significance_level = significance_level
         self.ridge_alpha = ridge_alpha
         self.test_size = test_size
         self.random_state = random_state
         self.n_permutations = n_permutations
+        self.min_marginal_mi = min_marginal_mi
+        self.n_jobs = n_jobs
         self.hypergraph = {'nodes': set(), 'edges': []}
         self.pairwise_baseline = {}
+        self._split_indices = {}
+
+    def _train_test_indices(self, n_samples):
+        """Returns (train_idx, test_idx) for n_samples rows, drawn once per sample count and then reused."""
+        if n_samples not in self._split_indices:
+            perm = np.random.default_rng(self.random_state).permutation(n_samples)
+            # Same test-set size as train_test_split (rounded up)
+            n_test = int(np.ceil(n_samples * self.test_size))
+            self._split_indices[n_samples] = (perm[n_test:], perm[:n_test])
+        return self._split_indices[n_samples]
+
+    def _residualize(self, A, Z=None, ridge_projection=None):
+        """Removes the linear (ridge) effect of Z from A, returning scaled residuals for the KSG estimator."""
+        if Z is not None and Z.shape[1] > 0:
+            Z_centred, proj = ridge_projection if ridge_projection is not None else _ridge_projection(Z)
+            A = A - A.mean(axis=0)
+            A = A - Z_centred @ (proj @ A)
+        return _scale_for_ksg(A, self.random_state)
 
     def conditional_mutual_information(self, X, Y, Z=None):
         """
         Compute conditional mutual information I(X;Y|Z) using the non-linear residual approximation.
         """
-        Y_1d = Y.ravel()
-
-        if Z is None or Z.shape[1] == 0:
-            mi_values = mutual_info_regression(X, Y_1d, random_state=self.random_state)
-            mi = np.mean(mi_values) if mi_values.size > 0 else 0.0
-        else:
-            # Conditional MI: I(X;Y|Z) ~ I(res_X|Z ; res_Y|Z)
-            X_2d = X.reshape(-1, X.shape[1]) if X.ndim == 1 else X
-
-            # Regress X on Z
-            model_x = Ridge(alpha=0.1).fit(Z, X_2d)
-            residual_x = X_2d - model_x.predict(Z)
-
-            # Regress Y on Z
-            model_y = Ridge(alpha=0.1).fit(Z, Y_1d)
-            residual_y = Y_1d - model_y.predict(Z)
-
-            # MI between residuals
-            mi_values = mutual_info_regression(residual_x, residual_y, random_state=self.random_state)
-            mi = np.mean(mi_values) if mi_values.size > 0 else 0.0
-        return mi
-
-    def test_independence(self, X, Y, Z=None):
-        """Test conditional independence (I(Y; X_S | Z)) using permutation test (for p-value)."""
-        Y_1d = Y.ravel()
-        observed_cmi = self.conditional_mutual_information(X, Y_1d, Z)
-
-        null_distribution = []
-        for _ in range(self.n_permutations):
-            Y_perm = np.random.permutation(Y_1d)
-            null_cmi = self.conditional_mutual_information(X, Y_perm, Z)
-            null_distribution.append(null_cmi)
-
-        p_value = np.mean(np.array(null_distribution) >= observed_cmi)
+        # Conditional MI: I(X;Y|Z) ~ I(res_X|Z ; res_Y|Z)
+        X_2d = X.reshape(-1, 1) if X.ndim == 1 else X
+        ridge_projection = _ridge_projection(Z) if Z is not None and Z.shape[1] > 0 else None
+        residual_x = self._residualize(X_2d, Z, ridge_projection)
+        residual_y = self._residualize(Y.ravel(), Z, ridge_projection)
+
+        trees_x = [cKDTree(residual_x[:, [c]]) for c in range(residual_x.shape[1])]
+        tree_y = cKDTree(residual_y[:, None])
+        identity = np.arange(len(residual_y))[None, :]
+        return _ksg_mean_mi(residual_x, trees_x, residual_y, tree_y, identity, _KSG_NEIGHBORS)[0]
+
+    def test_independence(self, X, Y, Z=None, residual_y=None, ridge_projection=None, tree_y=None):
+        """
+        Test conditional independence (I(Y; X_S | Z)) using permutation test (for p-value).
+        residual_y, ridge_projection and tree_y may be precomputed once per target and Z (see discover_hypergraph).
+        """
+        if ridge_projection is None and Z is not None and Z.shape[1] > 0:
+            ridge_projection = _ridge_projection(Z)
+
+        # Residuals are computed once; the null permutes the Y residuals instead of re-fitting per permutation
+        X_2d = X.reshape(-1, 1) if X.ndim == 1 else X
+        residual_x = self._residualize(X_2d, Z, ridge_projection)
+        if residual_y is None:
+            residual_y = self._residualize(Y.ravel(), Z, ridge_projection)
+            tree_y = None
+        if tree_y is None:
+            tree_y = cKDTree(residual_y[:, None])
+
+        # One tree per driver column, reused by the observed statistic and every permutation
+        trees_x = [cKDTree(residual_x[:, [c]]) for c in range(residual_x.shape[1])]
+
+        # Row 0 is the identity (observed statistic), the remaining rows form the null distribution
+        n = len(residual_y)
+        # Permutations are shuffled in place in one preallocated index buffer
+        rng = np.random.default_rng(self.random_state)
+        perms = np.empty((self.n_permutations + 1, n), dtype=np.intp)
+        perms[:] = np.arange(n)
+        rng.permuted(perms[1:], axis=1, out=perms[1:])
+        mi = _ksg_mean_mi(residual_x, trees_x, residual_y, tree_y, perms, _KSG_NEIGHBORS)
+        observed_cmi, null_distribution = mi[0], mi[1:]
+
+        p_value = (null_distribution >= observed_cmi).mean()
         is_independent = p_value > self.significance_level
         return is_independent, p_value, observed_cmi
 
@@ -87,21 +199,53 @@ class HypergraphCausalDiscovery:
         """Discover hypergraph structure for a specific target variable Y_t."""
         print(f"\n=== Discovering hypergraph for {target_var_t} ===")
 
-        Y = data_df[target_var_t].values.ravel()
+        Y = np.ascontiguousarray(data_df[target_var_t].values.ravel(), dtype=np.float32)
         hyperedges = []
 
         # Z: Conditioning set includes all other contemporaneous system variables
         Z_cols = [v for v in system_vars_t if v != target_var_t]
-        Z_data = data_df[Z_cols].values
+        Z_data = np.ascontiguousarray(data_df[Z_cols].values, dtype=np.float32)
 
-        for size in range(2, self.max_hyperedge_size + 1):
-            for source_set_cols in itertools.combinations(all_drivers_lagged_cols, size):
-                source_set_cols = list(source_set_cols)
-                X_set = data_df[source_set_cols].values
+        # All lagged drivers materialized once; subsets are integer column positions, names are only
+        # looked up for the reported hyperedges.
+        # Everything handed to the KSG kernels is float32 to halve the bandwidth of the neighbour searches
+        driver_arr = np.ascontiguousarray(data_df[all_drivers_lagged_cols].values, dtype=np.float32)
+        driver_names = np.asarray(all_drivers_lagged_cols)
+
+        # The ridge solve on Z and the residuals of Y are shared by every driver subset of this target
+        ridge_projection = _ridge_projection(Z_data) if Z_data.shape[1] > 0 else None
+        residual_y = self._residualize(Y, Z_data, ridge_projection)
+        tree_y = cKDTree(residual_y[:, None])
 
-                is_indep, p_value, cmi = self.test_independence(X_set, Y, Z_data)
+        # Drop drivers with no marginal dependence on the Y residuals before the combinatorial search
+        marginal_mi = mutual_info_regression(driver_arr, residual_y, random_state=self.random_state)
+        candidate_idx = np.flatnonzero(marginal_mi > self.min_marginal_mi).tolist()
+        print(f"Candidate drivers after marginal MI filter: {len(candidate_idx)}/{len(all_drivers_lagged_cols)}")
+
+        # Pairs found independent of Y|Z; larger sets containing one are not tested (apriori-style pruning)
+        independent_pairs = set()
+
+        for size in range(2, self.max_hyperedge_size + 1):
+            combos = [
+                list(idx_combo) for idx_combo in itertools.combinations(candidate_idx, size)
+                if size == 2 or not any(frozenset(pair) in independent_pairs
+                                        for pair in itertools.combinations(idx_combo, 2))
+            ]
+
+            # Each test only reads the shared per-target arrays, so a whole order is run in parallel;
+            # orders stay sequential because the pruning above needs the previous order's results
+            results = Parallel(n_jobs=self.n_jobs, backend='loky')(
+                delayed(self.test_independence)(driver_arr[:, idx_combo], Y, Z_data, residual_y, ridge_projection,
+                                                tree_y)
+                for idx_combo in combos
+            )
+
+            for idx_combo, (is_indep, p_value, cmi) in zip(combos, results):
+                if is_indep and size == 2:
+                    independent_pairs.add(frozenset(idx_combo))
 
                 if not is_indep:
+                    source_set_cols = driver_names[idx_combo].tolist()
                     hyperedge = {'sources': source_set_cols, 'target': target_var_t, 'cmi': cmi, 'p_value': p_value,
                                  'order': size}
                     hyperedges.append(hyperedge)
@@ -143,29 +287,15 @@ class HypergraphCausalDiscovery:
         # Standardize Y
         Y_norm = (Y - np.mean(Y)) / np.std(Y)
 
-        # Split data consistently for both models
-        X_train_p, X_test_p, Y_train, Y_test = train_test_split(
-            X_pair, Y_norm, test_size=self.test_size, random_state=self.random_state
-        )
-        X_train_h, X_test_h, _, _ = train_test_split(
-            X_hyper, Y_norm, test_size=self.test_size, random_state=self.random_state
-        )
-
-        scaler_p = StandardScaler()
-        X_train_p_scaled = scaler_p.fit_transform(X_train_p)
-        X_test_p_scaled = scaler_p.transform(X_test_p)
-
-        scaler_h = StandardScaler()
-        X_train_h_scaled = scaler_h.fit_transform(X_train_h)
-        X_test_h_scaled = scaler_h.transform(X_test_h)
-
-        # Fit and Score Pairwise (using scaled data)
-        model_pair = Ridge(alpha=self.ridge_alpha).fit(X_train_p_scaled, Y_train)
-        r2_pair = r2_score(Y_test, model_pair.predict(X_test_p_scaled))
-
-        # Fit and Score Hypergraph (using scaled data)
-        model_hyper = Ridge(alpha=self.ridge_alpha).fit(X_train_h_scaled, Y_train)
-        r2_hyper = r2_score(Y_test, model_hyper.predict(X_test_h_scaled))
+        # Split data consistently for both models (and across targets, via the cached indices)
+        train_idx, test_idx = self._train_test_indices(len(Y_norm))
+        X_train_p, X_test_p = X_pair[train_idx], X_pair[test_idx]
+        X_train_h, X_test_h = X_hyper[train_idx], X_hyper[test_idx]
+        Y_train, Y_test = Y_norm[train_idx], Y_norm[test_idx]
+
+        # Fit and Score Pairwise and Hypergraph (closed-form ridge on standardized drivers)
+        r2_pair = _ridge_r2(X_train_p, Y_train, X_test_p, Y_test, self.ridge_alpha)
+        r2_hyper = _ridge_r2(X_train_h, Y_train, X_test_h, Y_test, self.ridge_alpha)
 
         #4. Report Comparison
         print(f"\nPairwise Baseline (Best CMI Link: {best_pairwise_driver[0]}): R²={r2_pair:.4f}")